@@ -1,29 +1,351 @@
-import googlemaps
-from dotenv import load_dotenv
-import os
-import pandas as pd
+import functools
 import hashlib
 import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import googlemaps
+import numpy as np
+import pandas as pd
+import requests
+from dotenv import load_dotenv
 
 _CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", ".cache")
 os.makedirs(_CACHE_DIR, exist_ok=True)
+_CACHE_DB_PATH = os.path.join(_CACHE_DIR, "cache.db")
+_cache_db_lock = threading.Lock()
+
+# Preset zlib dictionary for cache values. Each value is a small JSON object that is too
+# short to compress well on its own, but shares most of its text with every other value.
+# Changing this makes existing cache entries unreadable, so bump both key versions below with it.
+_CACHE_ZDICT = b'{"lat": , "lng": }{"distance_m": , "duration_s": }'
+
+# Prefixes of the distance matrix and geocoding cache keys. Bump one to invalidate that part
+# of the cache when its key scheme or stored layout changes.
+_MATRIX_CACHE_KEY_VERSION = "v3"
+_GEOCODE_CACHE_KEY_VERSION = "v3"
+
+# Value of unpack_distance_matrix_dict cells without a distance or duration.
+MISSING_VALUE = -1
+
+load_dotenv()
+_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+
+_ROUTES_URL = "https://routes.googleapis.com/distanceMatrix/v2:computeRouteMatrix"
+_ROUTES_FIELD_MASK = (
+    "originIndex,destinationIndex,status,condition,distanceMeters,duration"
+)
+_TRAVEL_MODES = {
+    "driving": "DRIVE",
+    "walking": "WALK",
+    "bicycling": "BICYCLE",
+    "transit": "TRANSIT",
+}
+
+# computeRouteMatrix accepts at most 625 elements (origins x destinations) per request,
+# or 100 when routing transit.
+_MAX_ELEMENTS_PER_REQUEST = 625
+_MAX_TRANSIT_ELEMENTS_PER_REQUEST = 100
+
+# HTTP statuses of computeRouteMatrix responses that are worth retrying.
+_RETRIABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Client-side budget for computeRouteMatrix elements across all threads, matching the
+# default per-minute quota. Raise it if the project has been granted more.
+_ROUTES_ELEMENTS_PER_MINUTE = 3000
+_routes_budget_lock = threading.Lock()
+_routes_next_start = 0.0
+
+# Limits the number of Google Maps requests in flight at once, across all threads.
+_API_SEMAPHORE = threading.Semaphore(10)
+
+# In-memory LRU of get_distance_matrix results, checked before the disk cache.
+_MATRIX_MEMO_SIZE = 4096
+_matrix_memo = OrderedDict()
+_matrix_memo_lock = threading.Lock()
+
+# Error of pairs missing from a Routes API response. These are not cached.
+_NOT_RETURNED = "NOT_RETURNED"
+
+# Pair cache keys currently being fetched, mapped to an Event that is set once they are stored.
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _is_retriable(error):
+    # googlemaps.Client errors are not retried here: the client already retries
+    # internally until its retry_timeout and then raises googlemaps.exceptions.Timeout.
+    if isinstance(error, requests.HTTPError):
+        return error.response.status_code in _RETRIABLE_STATUS_CODES
+    return isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+
+def _wait_for_routes_budget(elements):
+    """
+    Block until the shared elements-per-minute budget allows a computeRouteMatrix request
+    of this many elements. Requests are spaced out in the order they reserve their slot.
+    """
+    global _routes_next_start
+    with _routes_budget_lock:
+        now = time.monotonic()
+        start = max(now, _routes_next_start)
+        _routes_next_start = start + elements * 60 / _ROUTES_ELEMENTS_PER_MINUTE
+    time.sleep(start - now)
+
+
+def _retry_delay(error, attempt, backoff, max_backoff):
+    # Jittered exponential backoff, so threads rate limited together don't retry together
+    delay = min(max_backoff, backoff * 2**attempt)
+    delay = delay / 2 + random.uniform(0, delay / 2)
+    if error.response is not None:
+        retry_after = error.response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+    return delay
+
+
+def _call_with_backoff(
+    func, *args, throttle=None, retries=10, backoff=1.0, max_backoff=120.0
+):
+    """
+    Call func(*args) under the API semaphore, retrying with jittered exponential backoff on
+    timeouts, dropped connections and rate limiting. throttle, if given, is called before
+    every attempt, outside the semaphore.
+    """
+    for attempt in range(retries):
+        if throttle is not None:
+            throttle()
+        try:
+            with _API_SEMAPHORE:
+                return func(*args)
+        except requests.RequestException as e:
+            if attempt == retries - 1 or not _is_retriable(e):
+                raise
+            time.sleep(_retry_delay(e, attempt, backoff, max_backoff))
+
+
+@functools.cache
+def _get_client():
+    """
+    Return a shared googlemaps.Client, so its HTTP session and open connections are reused across calls.
+    """
+    if not _API_KEY:
+        raise ValueError("GOOGLE_MAPS_API_KEY not found in .env")
+    return googlemaps.Client(key=_API_KEY, queries_per_second=50, retry_timeout=60)
 
 
-def _matrix_cache_key(origins, destinations, mode):
-    key_data = json.dumps(
-        {"origins": origins, "destinations": destinations, "mode": mode}, sort_keys=True
+@functools.cache
+def _get_routes_session():
+    """
+    Return a shared requests.Session for the Routes API, so its connections are reused across calls.
+    """
+    if not _API_KEY:
+        raise ValueError("GOOGLE_MAPS_API_KEY not found in .env")
+    session = requests.Session()
+    session.headers.update(
+        {"X-Goog-Api-Key": _API_KEY, "X-Goog-FieldMask": _ROUTES_FIELD_MASK}
     )
-    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+    return session
+
+
+def _max_elements_per_request(mode):
+    if mode == "transit":
+        return _MAX_TRANSIT_ELEMENTS_PER_REQUEST
+    return _MAX_ELEMENTS_PER_REQUEST
 
 
-def _matrix_cache_path(origins, destinations, mode):
-    key = _matrix_cache_key(origins, destinations, mode)
-    return os.path.join(_CACHE_DIR, f"matrix_{key}.json")
+def _waypoint(location):
+    # "lat,lng" strings and (lat, lng) tuples are sent as coordinates, anything else as an address
+    if isinstance(location, str):
+        try:
+            lat, lng = (float(part) for part in location.split(","))
+        except ValueError:
+            return {"waypoint": {"address": location}}
+    else:
+        lat, lng = location
+    return {"waypoint": {"location": {"latLng": {"latitude": lat, "longitude": lng}}}}
+
+
+def _compute_route_matrix(origins, destinations, mode):
+    """
+    Call the Routes API computeRouteMatrix endpoint and return its list of elements.
+    """
+    if mode not in _TRAVEL_MODES:
+        raise ValueError(f"Unsupported travel mode: {mode}")
+    body = {
+        "origins": [_waypoint(origin) for origin in origins],
+        "destinations": [_waypoint(dest) for dest in destinations],
+        "travelMode": _TRAVEL_MODES[mode],
+    }
+    response = _get_routes_session().post(_ROUTES_URL, json=body, timeout=60)
+    response.raise_for_status()
+    return response.json()
+
+
+def _route_element(element):
+    # Keep only what get_distance_matrix needs, as integer meters and seconds
+    error_code = element.get("status", {}).get("code")
+    if error_code:
+        return {"error": element["status"].get("message", f"code {error_code}")}
+    if element.get("condition") != "ROUTE_EXISTS":
+        return {"error": element.get("condition", "ROUTE_NOT_FOUND")}
+    # Zero values are omitted from the response
+    return {
+        "distance_m": element.get("distanceMeters", 0),
+        # Durations may have a fractional part, like "12.5s"
+        "duration_s": round(float(element.get("duration", "0s").rstrip("s"))),
+    }
+
+
+def _location_str(location):
+    # (lat, lng) tuples are written the same as the equivalent "lat,lng" string
+    if isinstance(location, str):
+        return location
+    return ",".join(str(part) for part in location)
+
+
+def _location_bytes(location):
+    return _location_str(location).encode("utf-8") + b"\x00"
+
+
+def _pair_cache_keys(origins, destinations, mode):
+    """
+    Return {(origin, destination): cache key} for every pair. Each origin is hashed once
+    and a copy of its hash state is extended per destination.
+    """
+    destination_bytes = [_location_bytes(dest) for dest in destinations]
+    keys = {}
+    for origin in origins:
+        origin_hash = hashlib.blake2b(mode.encode("utf-8") + b"\x00", digest_size=16)
+        origin_hash.update(_location_bytes(origin))
+        for destination, data in zip(destinations, destination_bytes):
+            pair_hash = origin_hash.copy()
+            pair_hash.update(data)
+            keys[(origin, destination)] = (
+                f"{_MATRIX_CACHE_KEY_VERSION}_{pair_hash.hexdigest()}"
+            )
+    return keys
+
+
+def _full_matrix_cache_key(origins, destinations, mode):
+    key_hash = hashlib.blake2b(mode.encode("utf-8") + b"\x00", digest_size=16)
+    for origin in origins:
+        key_hash.update(_location_bytes(origin))
+    key_hash.update(b"\x01")
+    for dest in destinations:
+        key_hash.update(_location_bytes(dest))
+    return f"{_MATRIX_CACHE_KEY_VERSION}_{key_hash.hexdigest()}"
+
+
+def _geocode_cache_key(location):
+    # Case and whitespace differences should share one cache entry
+    normalized = " ".join(location.lower().split())
+    key_hash = hashlib.blake2b(b"geocode\x00", digest_size=16)
+    key_hash.update(_location_bytes(normalized))
+    return f"{_GEOCODE_CACHE_KEY_VERSION}_{key_hash.hexdigest()}"
+
+
+@functools.cache
+def _get_cache_db():
+    """
+    Return the process-wide connection to the SQLite key-value cache in .cache/cache.db.
+    """
+    conn = sqlite3.connect(_CACHE_DB_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Serve reads from a memory map instead of one read() syscall per page, and
+    # only fsync at WAL checkpoints rather than on every commit.
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB)")
+    return conn
+
+
+def _encode_value(value):
+    compressor = zlib.compressobj(zdict=_CACHE_ZDICT)
+    return compressor.compress(json.dumps(value).encode("utf-8")) + compressor.flush()
+
+
+def _decode_value(data):
+    return json.loads(zlib.decompressobj(zdict=_CACHE_ZDICT).decompress(data))
+
+
+def _cache_get_many(keys, chunk_size=500):
+    """
+    Return {key: value} for the given keys that are present in the cache.
+    """
+    found = {}
+    with _cache_db_lock:
+        conn = _get_cache_db()
+        for k in range(0, len(keys), chunk_size):
+            chunk = keys[k : k + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value FROM cache WHERE key IN ({placeholders})", chunk
+            )
+            for key, value in rows:
+                found[key] = _decode_value(value)
+    return found
+
+
+def _cache_put_many(items):
+    data = [(key, _encode_value(value)) for key, value in items.items()]
+    with _cache_db_lock:
+        conn = _get_cache_db()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", data
+            )
+
+
+def _fetch_elements(pairs, mode):
+    """
+    Request the origins and destinations of the given (origin, destination) pairs from the Routes API,
+    store every returned element in the cache and return them as {pair cache key: element}.
+    """
+    origins = list(dict.fromkeys(origin for origin, _ in pairs))
+    destinations = list(dict.fromkeys(dest for _, dest in pairs))
+    matrix_response = _call_with_backoff(
+        _compute_route_matrix,
+        origins,
+        destinations,
+        mode,
+        throttle=functools.partial(
+            _wait_for_routes_budget, len(origins) * len(destinations)
+        ),
+    )
+    pair_keys = _pair_cache_keys(origins, destinations, mode)
+    fetched = {}
+    for element in matrix_response:
+        origin = origins[element.get("originIndex", 0)]
+        destination = destinations[element.get("destinationIndex", 0)]
+        fetched[pair_keys[(origin, destination)]] = _route_element(element)
+    _cache_put_many(fetched)
+
+    # Pairs left out of the response are reported as errors, but not cached
+    for key in pair_keys.values():
+        fetched.setdefault(key, {"error": _NOT_RETURNED})
+    return fetched
+
+
+def _copy_matrix(matrix):
+    # Memoized results are shared, so callers only ever get their own copy
+    return {
+        origin: {dest: dict(entry) for dest, entry in row.items()}
+        for origin, row in matrix.items()
+    }
 
 
 def get_distance_matrix(origins, destinations, mode="driving"):
     """
-    Load Google API key from .env and return distance matrix. Uses file cache in .cache/.
+    Return distance matrix using the Routes API computeRouteMatrix endpoint. Uses an in-memory LRU in front of the SQLite cache
+    in .cache/cache.db, which stores one entry per origin-destination pair.
 
     Parameters:
         origins (list of str): Origin addresses or "lat,lng".
@@ -31,140 +353,287 @@ def get_distance_matrix(origins, destinations, mode="driving"):
         mode (str): One of 'driving', 'walking', 'bicycling', 'transit'.
 
     Returns:
-        dict: {origin: {destination: {'distance': ..., 'duration': ...}}}
+        dict: {origin: {destination: {'distance_m': ..., 'duration_s': ...}}} or {origin: {destination: {'error': ...}}}
     """
-    cache_path = _matrix_cache_path(origins, destinations, mode)
+    memo_key = (tuple(origins), tuple(destinations), mode)
+    with _matrix_memo_lock:
+        if memo_key in _matrix_memo:
+            _matrix_memo.move_to_end(memo_key)
+            return _copy_matrix(_matrix_memo[memo_key])
 
-    if os.path.exists(cache_path):
-        with open(cache_path, "r") as f:
-            matrix_response = json.load(f)
-    else:
-        load_dotenv()
-        api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_MAPS_API_KEY not found in .env")
-
-        gmaps = googlemaps.Client(key=api_key)
-        matrix_response = gmaps.distance_matrix(origins, destinations, mode=mode)
-        with open(cache_path, "w") as f:
-            json.dump(matrix_response, f)
-    result = {}
-    for i, origin in enumerate(origins):
-        result[origin] = {}
-        for j, destination in enumerate(destinations):
-            element = matrix_response["rows"][i]["elements"][j]
-            if element["status"] == "OK":
-                result[origin][destination] = {
-                    "distance": element["distance"]["text"],
-                    "duration": element["duration"]["text"],
-                }
-            else:
-                result[origin][destination] = {"error": element["status"]}
-    
-    return result
+    # Look up every origin-destination pair individually, and only ask the API for
+    # the origins and destinations that still have missing pairs.
+    pair_keys = _pair_cache_keys(origins, destinations, mode)
+    elements = _cache_get_many(list(set(pair_keys.values())))
+    missing = {key: pair for pair, key in pair_keys.items() if key not in elements}
+    while missing:
+        # Claim the missing pairs nobody else is fetching, and wait for the rest
+        claimed = {}
+        pending = []
+        with _in_flight_lock:
+            for key, pair in missing.items():
+                if key in _in_flight:
+                    pending.append(_in_flight[key])
+                else:
+                    _in_flight[key] = threading.Event()
+                    claimed[key] = pair
+        try:
+            if claimed:
+                # Another thread may have stored them between our lookup and the claim
+                elements.update(_cache_get_many(list(claimed)))
+                to_fetch = [
+                    pair for key, pair in claimed.items() if key not in elements
+                ]
+                if to_fetch:
+                    elements.update(_fetch_elements(to_fetch, mode))
+        finally:
+            with _in_flight_lock:
+                for key in claimed:
+                    _in_flight.pop(key).set()
+        for event in pending:
+            event.wait()
+        elements.update(
+            _cache_get_many([key for key in missing if key not in elements])
+        )
+        missing = {key: pair for key, pair in missing.items() if key not in elements}
+
+    # Cached elements are already in the result format
+    result = {
+        origin: {
+            destination: elements[pair_keys[(origin, destination)]]
+            for destination in destinations
+        }
+        for origin in origins
+    }
+
+    # Pairs the API left out must be retried on the next call, so don't memoize them
+    if not any(element.get("error") == _NOT_RETURNED for element in elements.values()):
+        with _matrix_memo_lock:
+            _matrix_memo[memo_key] = result
+            if len(_matrix_memo) > _MATRIX_MEMO_SIZE:
+                _matrix_memo.popitem(last=False)
+    return _copy_matrix(result)
 
 
-def get_distance_matrix_batched(origins, destinations, mode="driving", batch_size=25):
+def _upper_triangle_entries(origins, destinations, mode, batch_size, max_workers):
     """
-    Wrapper for get_distance_matrix that batches requests to max 25x25 and only computes the upper triangular matrix (one-way directions).
+    Request the upper triangular matrix block by block from a thread pool, and yield
+    (i, j, entry) for every origin index i and destination index j > i as blocks complete.
+    """
+    max_elements = _max_elements_per_request(mode)
+    if batch_size is None:
+        batch_size = math.isqrt(max_elements)
+    elif batch_size**2 > max_elements:
+        raise ValueError(
+            f"batch_size {batch_size} exceeds {max_elements} elements per request"
+        )
+    n = len(origins)
+    m = len(destinations)
+
+    # Only consider blocks with at least one destination index > origin index
+    blocks = [
+        (i, j)
+        for i in range(0, n, batch_size)
+        for j in range(0, m, batch_size)
+        if min(j + batch_size, m) - 1 > i
+    ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {
+            ex.submit(
+                get_distance_matrix,
+                origins[i : i + batch_size],
+                destinations[j : j + batch_size],
+                mode,
+            ): (i, j)
+            for i, j in blocks
+        }
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                block_result = future.result()
+                i0, j0 = futures[future]
+                for i in range(i0, min(i0 + batch_size, n)):
+                    row = block_result[origins[i]]
+                    for j in range(max(j0, i + 1), min(j0 + batch_size, m)):
+                        yield i, j, row[destinations[j]]
+                if done % 100 == 0:
+                    print(f"Processed block {done} of {len(futures)}")
+        except BaseException:
+            # Don't request the queued blocks once one has failed or the caller stopped
+            ex.shutdown(cancel_futures=True)
+            raise
+
+
+def get_distance_matrix_batched(
+    origins, destinations, mode="driving", batch_size=None, max_workers=10
+):
+    """
+    Wrapper for get_distance_matrix that only computes the upper triangular matrix (one-way directions).
+    The matrix is tiled into batch_size x batch_size blocks, each sent as one API call, and blocks are
+    sent concurrently from a thread pool. Blocks on the diagonal are requested whole and their lower
+    triangular cells are discarded.
 
     Parameters:
         origins (list of str): Origin addresses or "lat,lng".
         destinations (list of str): Destination addresses or "lat,lng".
         mode (str): Travel mode.
-        batch_size (int): Max batch size for API call (default 25).
+        batch_size (int): Origins and destinations per API call. Defaults to the largest square block
+            the API allows for the mode: 25 (625 elements), or 10 (100 elements) for transit.
+        max_workers (int): Number of blocks requested concurrently (default 10).
 
     Returns:
-        dict: {origin: {destination: {'distance': ..., 'duration': ...}}}
+        dict: {origin: {destination: {'distance_m': ..., 'duration_s': ...}}} or {origin: {destination: {'error': ...}}}
     """
-    n = len(origins)
-    m = len(destinations)
-    result = {}
-    for i in range(n):
-        # Only consider destinations with index > i for upper triangle
-        dest_indices = [j for j in range(i + 1, m)]
-        if not dest_indices:
-            continue
-        # Batch destinations for this origin
-        if i % 10 == 0:
-            print(f"Processing origin {i + 1} of {n}: {origins[i]}")
-        for k in range(0, len(dest_indices), batch_size):
-            batch_dest_indices = dest_indices[k : k + batch_size]
-            batch_destinations = [destinations[j] for j in batch_dest_indices]
-            batch_origins = [origins[i]]
-            batch_result = get_distance_matrix(batch_origins, batch_destinations, mode)
-            origin_addr = list(batch_result.keys())[0]
-            if origin_addr not in result:
-                result[origin_addr] = {}
-            for dest_addr in batch_result[origin_addr]:
-                result[origin_addr][dest_addr] = batch_result[origin_addr][dest_addr]
+    # Pre-seed in origin order so the result does not depend on completion order
+    result = {origins[i]: {} for i in range(min(len(origins), len(destinations) - 1))}
+    for i, j, entry in _upper_triangle_entries(
+        origins, destinations, mode, batch_size, max_workers
+    ):
+        result[origins[i]][destinations[j]] = entry
     return result
 
 
+def get_distance_matrix_arrays(
+    origins, destinations, mode="driving", batch_size=None, max_workers=10
+):
+    """
+    Like get_distance_matrix_batched, but returns the upper triangular matrix as two int32 arrays
+    indexed like origins and destinations, with MISSING_VALUE below the diagonal and where there is
+    no route. The arrays are saved to .cache/full_matrix_<key>.npz and loaded from there on later
+    calls with the same origins, destinations and mode.
+
+    Parameters:
+        origins (list of str): Origin addresses or "lat,lng".
+        destinations (list of str): Destination addresses or "lat,lng".
+        mode (str): Travel mode.
+        batch_size (int): Origins and destinations per API call. Defaults to the largest square block
+            the API allows for the mode.
+        max_workers (int): Number of blocks requested concurrently (default 10).
+
+    Returns:
+        tuple: (distances in meters, durations in seconds), each np.ndarray of shape (len(origins), len(destinations))
+    """
+    key = _full_matrix_cache_key(origins, destinations, mode)
+    path = os.path.join(_CACHE_DIR, f"full_matrix_{key}.npz")
+    if os.path.exists(path):
+        with np.load(path) as data:
+            return data["distances"], data["durations"]
+
+    shape = (len(origins), len(destinations))
+    distances = np.full(shape, MISSING_VALUE, dtype=np.int32)
+    durations = np.full(shape, MISSING_VALUE, dtype=np.int32)
+    complete = True
+    for i, j, entry in _upper_triangle_entries(
+        origins, destinations, mode, batch_size, max_workers
+    ):
+        distances[i, j] = entry.get("distance_m", MISSING_VALUE)
+        durations[i, j] = entry.get("duration_s", MISSING_VALUE)
+        if entry.get("error") == _NOT_RETURNED:
+            complete = False
+
+    # Don't persist pairs the API left out, so they are retried next time
+    if complete:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                distances=distances,
+                durations=durations,
+                origins=np.array([_location_str(origin) for origin in origins]),
+                destinations=np.array([_location_str(dest) for dest in destinations]),
+            )
+        os.replace(tmp_path, path)
+    return distances, durations
+
+
 def unpack_distance_matrix_dict(matrix_dict):
     """
     Unpacks a distance matrix dictionary into a pandas DataFrame. Columns are destinations (lng,lat), rows are origins (lng,lat).
+    Returns int32 DataFrames of distances in meters and durations in seconds, with MISSING_VALUE where there is no route.
     """
     # Get all unique origins and destinations
     origins = list(matrix_dict.keys())
-    destinations = set()
-    for dests in matrix_dict.values():
-        destinations.update(dests.keys())
-    destinations = sorted(destinations)
-
-    # Build DataFrame
-    distance_data = []
-    time_data = []
-    for origin in origins:
-        distance_row = []
-        time_row = []
-        for destination in destinations:
-            entry = matrix_dict[origin].get(destination, {})
-            if 'distance' in entry:
-                distance_row.append(entry['distance'])
-            else:
-                distance_row.append(None)
-            if 'duration' in entry:
-                time_row.append(entry['duration'])
-            else:
-                time_row.append(None)
-        distance_data.append(distance_row)
-        time_data.append(time_row)
-    distance_df = pd.DataFrame(distance_data, index=origins, columns=destinations)
-    distance_df.index.name = 'Origin'
-    distance_df.columns.name = 'Destination'
-    time_df = pd.DataFrame(time_data, index=origins, columns=destinations)
-    time_df.index.name = 'Origin'
-    time_df.columns.name = 'Destination'
-    
+    destinations = sorted({dest for dests in matrix_dict.values() for dest in dests})
+
+    # Fill contiguous int32 buffers straight from the entries, with MISSING_VALUE
+    # for absent pairs and errors. pd.DataFrame.from_dict would turn (lat, lng)
+    # keys into a MultiIndex, so the index and columns are passed explicitly.
+    shape = (len(origins), len(destinations))
+    empty = {}
+    entries = [
+        matrix_dict[origin].get(dest, empty)
+        for origin in origins
+        for dest in destinations
+    ]
+    distances = np.fromiter(
+        (entry.get("distance_m", MISSING_VALUE) for entry in entries),
+        dtype=np.int32,
+        count=len(entries),
+    ).reshape(shape)
+    durations = np.fromiter(
+        (entry.get("duration_s", MISSING_VALUE) for entry in entries),
+        dtype=np.int32,
+        count=len(entries),
+    ).reshape(shape)
+
+    distance_df = pd.DataFrame(distances, index=origins, columns=destinations)
+    distance_df.index.name = "Origin"
+    distance_df.columns.name = "Destination"
+    time_df = pd.DataFrame(durations, index=origins, columns=destinations)
+    time_df.index.name = "Origin"
+    time_df.columns.name = "Destination"
+
     return distance_df, time_df
 
 
-def get_coordinates(locations):
+def _geocode(location):
+    geocode_result = _get_client().geocode(location)
+    if geocode_result and "geometry" in geocode_result[0]:
+        latlng = geocode_result[0]["geometry"]["location"]
+        return {"lat": latlng["lat"], "lng": latlng["lng"]}
+    return {"error": "Not found"}
+
+
+def _geocode_and_cache(key, location):
+    # Store each found location as soon as it arrives, so a later failure can't lose it
+    coordinates = _call_with_backoff(_geocode, location)
+    if "error" not in coordinates:
+        _cache_put_many({key: coordinates})
+    return coordinates
+
+
+def get_coordinates(locations, max_workers=10):
     """
     Given a list of location names/addresses, return their latitude and longitude using Google Maps Geocoding API.
+    Found locations are cached in .cache/cache.db, and uncached locations are geocoded
+    concurrently from a thread pool. Locations that are not found are retried on every call.
 
     Parameters:
         locations (list of str): List of addresses or place names.
+        max_workers (int): Number of locations geocoded concurrently (default 10).
 
     Returns:
         dict: {location: {'lat': ..., 'lng': ...}} or {location: {'error': ...}}
     """
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_MAPS_API_KEY not found in .env")
+    cache_keys = {location: _geocode_cache_key(location) for location in locations}
+    coordinates = _cache_get_many(list(set(cache_keys.values())))
+    missing = {}
+    for location, key in cache_keys.items():
+        if key not in coordinates:
+            missing.setdefault(key, location)
 
-    gmaps = googlemaps.Client(key=api_key)
-    result = {}
-    for location in locations:
-        geocode_result = gmaps.geocode(location)
-        if geocode_result and "geometry" in geocode_result[0]:
-            latlng = geocode_result[0]["geometry"]["location"]
-            result[location] = {"lat": latlng["lat"], "lng": latlng["lng"]}
-        else:
-            result[location] = {"error": "Not found"}
-    return result
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            try:
+                fetched = dict(
+                    zip(missing, ex.map(_geocode_and_cache, missing, missing.values()))
+                )
+            except BaseException:
+                # Don't geocode the queued locations once one has failed
+                ex.shutdown(cancel_futures=True)
+                raise
+        coordinates.update(fetched)
+    return {location: coordinates[cache_keys[location]] for location in locations}
 
 
 if __name__ == "__main__":